@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import text, func
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from pydantic import TypeAdapter
 from typing import List
-from datetime import datetime, timezone
-from db import get_db
+from db import SessionLocal
+from db.session import engine
 from models import Variable, VariableVersion
 from schemas import (VariableCreate,VariableUpdate,VariableResponse,VariableCalcRequest,ErrorResponse,CalculationType)
+from services import calculation_service
+from utils.cache import create_response_cache
 
 
 
@@ -19,6 +26,76 @@ router = APIRouter(
     }
 )
 
+# Columns of the rows serialized as VariableResponse.
+# Read queries select only these columns as plain rows, so no ORM object is
+# built, tracked or instrumented per row and no unused column is fetched
+_RESPONSE_COLUMNS = (
+    Variable.id,
+    Variable.name,
+    Variable.description,
+    Variable.calculation_type,
+    Variable.is_active,
+    Variable.created_by,
+    Variable.created_at
+)
+
+# Lookup statements, built once at import time instead of on every request.
+# Values are passed as bound parameters, so each statement is constructed once
+# and its compiled form is reused from the engine's compiled cache
+_ACTIVE_VARIABLES_PAGE = (
+    select(*_RESPONSE_COLUMNS)
+    .where(Variable.is_active == True)
+    .order_by(Variable.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+_VARIABLE_BY_ID = select(*_RESPONSE_COLUMNS).where(Variable.id == bindparam("variable_id"))
+_SET_ACTIVE_VARIABLE_EDITOR = (
+    update(Variable)
+    .where(Variable.id == bindparam("variable_id"), Variable.is_active == True)
+    .values(updated_by=bindparam("edited_by"))
+    .returning(Variable)
+)
+_DEACTIVATE_VARIABLE = (
+    update(Variable)
+    .where(Variable.id == bindparam("variable_id"))
+    .values(is_active=False)
+    .execution_options(synchronize_session=False)
+)
+
+# Serializer for variable lists, built once. The read endpoints validate the rows
+# and dump them to JSON bytes in a single call each, and return (and cache) those
+# bytes directly instead of letting FastAPI re-encode the list item by item
+_VARIABLE_LIST_ADAPTER = TypeAdapter(List[VariableResponse])
+
+# Cache for the read endpoints. Variables change far less often than they are read,
+# so hot reads are served from the cache; every write invalidates the whole cache.
+# Shared through Redis across worker processes when REDIS_URL is set
+variables_cache = create_response_cache("variables", maxsize=1024, ttl=60)
+
+
+def _insert_ignoring_conflicts(db: Session, model, index_elements: List[str]):
+    """
+    Build an INSERT for the given model that skips rows violating a unique index.
+    
+    SQLite and PostgreSQL support ON CONFLICT DO NOTHING, so a duplicate simply
+    returns no row. Other dialects fall back to a plain INSERT, where a duplicate
+    raises IntegrityError instead.
+    
+    Args:
+        db (Session): Database session used to detect the dialect
+        model: ORM model to insert into
+        index_elements (List[str]): Columns of the unique index to check
+    
+    Returns:
+        Insert: The INSERT statement
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(model)
 
 
 
@@ -26,7 +103,7 @@ router = APIRouter(
         status.HTTP_201_CREATED: {"description": "Variable created successfully"},
         status.HTTP_400_BAD_REQUEST: {"description": "Variable already exists"},
     })
-async def create_variable(payload: VariableCreate, db: Session = Depends(get_db)):
+def create_variable(payload: VariableCreate):
     """
     Create a new credit scoring variable.
     
@@ -40,7 +117,6 @@ async def create_variable(payload: VariableCreate, db: Session = Depends(get_db)
             - calculation_type: Type of calculation (live/dwh/hybrid)
             - sql_script: SQL script for variable calculation
             - created_by: User creating the variable
-        db (Session): Database session
     
     Returns:
         VariableResponse: The created variable with its metadata
@@ -48,57 +124,163 @@ async def create_variable(payload: VariableCreate, db: Session = Depends(get_db)
     Raises:
         HTTPException: If a variable with the same name already exists
     """
-    # Check if variable with the same name already exists
-    if db.query(Variable).filter_by(name=payload.name).first():
+    db = SessionLocal()
+
+    # Insert the Variable row in a single round trip. The unique index on
+    # "name" rejects duplicates, so no existence check is needed beforehand.
+    # created_at is left to the database's server default for both inserts
+    stmt = (
+        _insert_ignoring_conflicts(db, Variable, ["name"])
+        .values(
+            name=payload.name,
+            description=payload.description,
+            calculation_type=payload.calculation_type.value,  # Use the enum value
+            created_by=payload.created_by
+        )
+        .returning(Variable)
+    )
+    try:
+        var = db.scalars(stmt).first()
+        if var is not None:
+            # Add the first version of the variable's SQL with a Core INSERT in the
+            # same transaction, using the id RETURNING handed back above
+            db.execute(
+                insert(VariableVersion).values(
+                    variable_id=var.id,
+                    version_number=1,
+                    code=payload.sql_script,
+                    created_by=payload.created_by
+                )
+            )
+            db.commit()
+    except IntegrityError:
+        # Dialects without ON CONFLICT support report the duplicate as an error,
+        # either on the INSERT or, at the latest, on commit
+        db.rollback()
+        var = None
+
+    if var is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Variable with this name already exists"
         )
 
-
-    # Create the Variable object
-    var = Variable(
-        name=payload.name,
-        description=payload.description,
-        calculation_type=payload.calculation_type.value,  # Use the enum value
-        created_by=payload.created_by,
-        created_at=datetime.now(timezone.utc)
-    )
-    db.add(var)
-    db.flush()
-
-    # Add the first version of the variable's SQL
-    version = VariableVersion(
-        variable_id=var.id,
-        version=1,
-        code=payload.sql_script,
-        created_by=payload.created_by,
-        created_at=datetime.now(timezone.utc)
-    )
-    db.add(version)
-    db.commit()
-    db.refresh(var)
+    variables_cache.invalidate()
     return var
 
 
 
+@router.post("/bulk", response_model=List[VariableResponse], status_code=status.HTTP_201_CREATED, responses={
+        status.HTTP_201_CREATED: {"description": "Variables created successfully"},
+        status.HTTP_400_BAD_REQUEST: {"description": "A variable already exists"},
+    })
+def create_variables_bulk(payload: List[VariableCreate]):
+    """
+    Create several credit scoring variables at once.
+
+    All variables and their initial versions are created in one transaction:
+    either every variable is created, or none is.
+
+    Args:
+        payload (List[VariableCreate]): The variables to create, each containing:
+            - name: Unique name of the variable
+            - description: Description of what the variable calculates
+            - calculation_type: Type of calculation (live/dwh/hybrid)
+            - sql_script: SQL script for variable calculation
+            - created_by: User creating the variable
+
+    Returns:
+        List[VariableResponse]: The created variables, in the order they were given
+
+    Raises:
+        HTTPException: If no variables are given, or a variable with one of the names already exists
+    """
+    db = SessionLocal()
+
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No variables provided"
+        )
+
+    try:
+        # One executemany INSERT for all variables. RETURNING does not guarantee row
+        # order on every dialect, so the new rows are matched to the payload by their
+        # unique name rather than with sort_by_parameter_order, which would fall back
+        # to one INSERT per row where the database has no deterministic ordering
+        variables = db.scalars(
+            insert(Variable).returning(Variable),
+            [
+                {
+                    "name": item.name,
+                    "description": item.description,
+                    "calculation_type": item.calculation_type.value,
+                    "created_by": item.created_by
+                }
+                for item in payload
+            ]
+        ).all()
+        variables_by_name = {var.name: var for var in variables}
+        variables = [variables_by_name[item.name] for item in payload]
+
+        # One executemany INSERT for all initial versions
+        db.execute(
+            insert(VariableVersion),
+            [
+                {
+                    "variable_id": var.id,
+                    "version_number": 1,
+                    "code": item.sql_script,
+                    "created_by": item.created_by
+                }
+                for var, item in zip(variables, payload)
+            ]
+        )
+        db.commit()
+    except IntegrityError:
+        # A name is already taken, or repeated within the payload
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Variable with one of these names already exists"
+        )
+
+    variables_cache.invalidate()
+    return variables
+
+
+
 @router.get("/", response_model=List[VariableResponse], responses={
         status.HTTP_200_OK: {"description": "List of active variables retrieved successfully"}
     })
-async def get_all_variables(db: Session = Depends(get_db)):
+def get_all_variables(
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of variables to return"),
+    offset: int = Query(0, ge=0, description="Number of variables to skip")
+):
     """
     Get all active credit scoring variables.
     
-    This endpoint retrieves a list of all active variables in the system.
+    This endpoint retrieves a page of the active variables in the system, ordered by ID.
     Only variables with is_active=True are returned.
     
     Args:
-        db (Session): Database session
+        limit (int): Maximum number of variables to return
+        offset (int): Number of variables to skip
     
     Returns:
         List[VariableResponse]: List of active variables
     """
-    return db.query(Variable).filter_by(is_active=True).all()
+    cache_key = ("variables", limit, offset)
+    cached = variables_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    generation = variables_cache.generation
+    db = SessionLocal()
+    rows = db.execute(_ACTIVE_VARIABLES_PAGE, {"limit": limit, "offset": offset}).all()
+    content = _VARIABLE_LIST_ADAPTER.dump_json(_VARIABLE_LIST_ADAPTER.validate_python(rows, from_attributes=True))
+    variables_cache.set(cache_key, content, generation)
+    return Response(content=content, media_type="application/json")
 
 
 
@@ -106,7 +288,7 @@ async def get_all_variables(db: Session = Depends(get_db)):
         status.HTTP_200_OK: {"description": "Variable retrieved successfully"},
         status.HTTP_404_NOT_FOUND: {"description": "Variable not found"}
     })
-async def get_variable(variable_id: int, db: Session = Depends(get_db)):
+def get_variable(variable_id: int):
     """
     Get a specific credit scoring variable by ID.
     
@@ -115,7 +297,6 @@ async def get_variable(variable_id: int, db: Session = Depends(get_db)):
     
     Args:
         variable_id (int): The ID of the variable to retrieve
-        db (Session): Database session
     
     Returns:
         VariableResponse: The requested variable
@@ -123,26 +304,38 @@ async def get_variable(variable_id: int, db: Session = Depends(get_db)):
     Raises:
         HTTPException: If the variable is not found or is inactive
     """
-    var = db.query(Variable).filter_by(id=variable_id).first()
-    if not var:
+    cache_key = ("variable", variable_id)
+    cached = variables_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    generation = variables_cache.generation
+    db = SessionLocal()
+    row = db.execute(_VARIABLE_BY_ID, {"variable_id": variable_id}).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Variable not found"
         )
-    return var
+    # Cached as bytes, like the list endpoint, so the Redis cache can store it as is
+    content = VariableResponse.model_validate(row).model_dump_json().encode()
+    variables_cache.set(cache_key, content, generation)
+    return Response(content=content, media_type="application/json")
 
 
 
 @router.put("/{variable_id}", response_model=VariableResponse, responses={
         status.HTTP_200_OK: {"description": "Variable updated successfully"},
-        status.HTTP_404_NOT_FOUND: {"description": "Variable not found"}
+        status.HTTP_404_NOT_FOUND: {"description": "Variable not found"},
+        status.HTTP_409_CONFLICT: {"model": ErrorResponse, "description": "Variable was updated concurrently"}
     })
-async def update_variable(variable_id: int,payload: VariableUpdate,db: Session = Depends(get_db)):
+def update_variable(variable_id: int,payload: VariableUpdate):
     """
     Update a credit scoring variable.
     
     This endpoint updates an existing variable by creating a new version
-    with the updated SQL script. The change reason and editor are recorded.
+    with the updated SQL script. The change reason and editor are recorded,
+    and the editor is stored as the variable's updated_by.
     
     Args:
         variable_id (int): The ID of the variable to update
@@ -150,38 +343,55 @@ async def update_variable(variable_id: int,payload: VariableUpdate,db: Session =
             - sql_script: New SQL script for the variable
             - change_reason: Reason for the update
             - edited_by: User making the update
-        db (Session): Database session
     
     Returns:
         VariableResponse: The updated variable
     
     Raises:
-        HTTPException: If the variable is not found or is inactive
+        HTTPException: If the variable is not found or is inactive, or if a
+            concurrent update created the same version first
     """
-    var = db.query(Variable).filter_by(id=variable_id, is_active=True).first()
+    db = SessionLocal()
+
+    # Record the editor with a single targeted UPDATE that also returns the row,
+    # instead of SELECTing the variable first; no row means it is missing or inactive
+    var = db.scalars(
+        _SET_ACTIVE_VARIABLE_EDITOR,
+        {"variable_id": variable_id, "edited_by": payload.edited_by}
+    ).first()
     if not var:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Variable not found"
         )
 
-    latest = (
-        db.query(VariableVersion)
-        .filter_by(variable_id=var.id)
-        .order_by(VariableVersion.version_number.desc())
-        .first()
-    )
-
-    new_version = VariableVersion(
-        variable_id=var.id,
-        version_number=latest.version_number + 1,
-        sql_script=payload.sql_script,
-        change_reason=payload.change_reason,
-        edited_by=payload.edited_by,
-        edited_at=datetime.utcnow()
+    # Compute the next version number inside the INSERT itself, so there is no
+    # separate "fetch latest version" round trip and no race between the two
+    next_version = (
+        select(func.coalesce(func.max(VariableVersion.version_number), 0) + 1)
+        .where(VariableVersion.variable_id == var.id)
+        .scalar_subquery()
     )
-    db.add(new_version)
-    db.commit()
+    try:
+        db.execute(
+            insert(VariableVersion).values(
+                variable_id=var.id,
+                version_number=next_version,
+                code=payload.sql_script,
+                change_reason=payload.change_reason,
+                created_by=payload.edited_by
+            )
+        )
+        db.commit()
+    except IntegrityError:
+        # A concurrent update took the same version number; the unique
+        # constraint rejects the second one instead of creating a duplicate
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Variable was updated concurrently, please retry"
+        )
+    variables_cache.invalidate()
     return var
 
 
@@ -190,7 +400,7 @@ async def update_variable(variable_id: int,payload: VariableUpdate,db: Session =
         status.HTTP_200_OK: {"description": "Variable deleted successfully"},
         status.HTTP_404_NOT_FOUND: {"description": "Variable not found"}
     })
-async def delete_variable(variable_id: int, db: Session = Depends(get_db)):
+def delete_variable(variable_id: int):
     """
     Delete a credit scoring variable.
     
@@ -199,7 +409,6 @@ async def delete_variable(variable_id: int, db: Session = Depends(get_db)):
     
     Args:
         variable_id (int): The ID of the variable to delete
-        db (Session): Database session
     
     Returns:
         dict: Success message
@@ -207,15 +416,19 @@ async def delete_variable(variable_id: int, db: Session = Depends(get_db)):
     Raises:
         HTTPException: If the variable is not found
     """
-    var = db.query(Variable).filter_by(id=variable_id).first()
-    if not var:
+    db = SessionLocal()
+
+    # Soft delete with a single UPDATE; no matched row means the variable does not exist
+    result = db.execute(_DEACTIVATE_VARIABLE, {"variable_id": variable_id})
+    if result.rowcount == 0:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Variable not found"
         )
 
-    var.is_active = False
     db.commit()
+    variables_cache.invalidate()
     
     return {
         "status": "success",
@@ -225,55 +438,62 @@ async def delete_variable(variable_id: int, db: Session = Depends(get_db)):
 
 
 
+def _find_versions_to_calculate(app_id: str, variable_ids: List[int]):
+    """
+    Look up the latest versions of the requested variables, and which of them still need calculating.
+    
+    Both lookups run in one threadpool call that closes the request session before returning.
+    Every chunk uses its own session, so the request returns its connection to the pool
+    before fanning out instead of holding it idle, and never holds a connection while it
+    waits for a thread: those could be taken by requests waiting for that connection.
+    
+    Args:
+        app_id (str): ID of the application to calculate variables for
+        variable_ids (List[int]): IDs of the requested variables
+    
+    Returns:
+        tuple: The latest versions, and those without a stored result for the application
+    """
+    db = SessionLocal()
+    try:
+        latest_versions = calculation_service.get_latest_versions(db, variable_ids)
+        if not latest_versions:
+            return latest_versions, []
+        # Only run the scripts of versions without a stored result for this application
+        return latest_versions, calculation_service.get_uncalculated_versions(db, app_id, latest_versions)
+    finally:
+        SessionLocal.remove()
+
+
+
 @router.post("/calculate",responses={
         status.HTTP_200_OK: {"description": "Variables calculated successfully"},
         status.HTTP_400_BAD_REQUEST: {"description": "Invalid request"},
         status.HTTP_404_NOT_FOUND: {"description": "No variable versions found"}
     })
-async def calculate_variables(payload: VariableCalcRequest,db: Session = Depends(get_db)):
+async def calculate_variables(payload: VariableCalcRequest):
     """
     Calculate variables for an application.
     
     This endpoint calculates the specified variables for a given application.
-    It uses the latest active version of each variable's SQL script.
+    It uses the latest active version of each variable's SQL script. Variables
+    whose latest version already has a stored result for the application are
+    not recalculated.
     
     Args:
         payload (VariableCalcRequest): The calculation request containing:
             - app_id: ID of the application to calculate variables for
             - variable_ids: List of variable IDs to calculate
-        db (Session): Database session
     
     Returns:
-        dict: Calculation results for each variable
+        dict: IDs of the calculated variables, and which of them reused a stored result
     
     Raises:
         HTTPException: If no active variable versions are found
     """
-    if not payload.variable_ids:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No variable_ids provided"
-        )
-
-    # Get latest versions
-    subquery = (
-        db.query(
-            VariableVersion.variable_id,
-            func.max(VariableVersion.version_number).label("max_version")
-        )
-        .filter(VariableVersion.variable_id.in_(payload.variable_ids))
-        .group_by(VariableVersion.variable_id)
-        .subquery()
-    )
-
-    latest_versions = (
-        db.query(VariableVersion)
-        .join(
-            subquery,
-            (VariableVersion.variable_id == subquery.c.variable_id) &
-            (VariableVersion.version_number == subquery.c.max_version)
-        )
-        .all()
+    # Database work is blocking, so it runs in the threadpool to keep the event loop free
+    latest_versions, pending_versions = await run_in_threadpool(
+        _find_versions_to_calculate, payload.app_id, payload.variable_ids
     )
 
     if not latest_versions:
@@ -282,53 +502,19 @@ async def calculate_variables(payload: VariableCalcRequest,db: Session = Depends
             detail="No variable versions found"
         )
 
-    # Prepare CTEs
-    cte_blocks = []
-    result_selects = []
-    execution_selects = []
-
-    for var in latest_versions:
-        var_id = var.variable_id
-        sql_code = var.sql_script.strip().rstrip(";")
-
-        cte_blocks.append(f"""
-        var_{var_id} AS (
-            SELECT
-                :app_id AS application_id,
-                {var_id} AS variable_id,
-                CAST((
-                    {sql_code}
-                ) AS TEXT) AS value
-        )
-        """.strip())
-
-        result_selects.append(f"SELECT *, 'system' AS calculated_by FROM var_{var_id}")
-        execution_selects.append(f"""
-        SELECT
-            :app_id AS application_id,
-            {var_id} AS variable_id,
-            'system' AS executed_by,
-            value AS result
-        FROM var_{var_id}
-        """.strip())
-
-    cte_sql = ",\n".join(cte_blocks)
-    results_sql = "\nUNION ALL\n".join(result_selects)
-
-    # Insert into variable_results
-    sql_results = f"""
-    WITH
-    {cte_sql}
-    INSERT INTO variable_results (application_id, variable_id, value, calculated_by)
-    {results_sql};
-    """
-
-    db.execute(text(sql_results), {"app_id": payload.app_id})
-    db.commit()
+    # Calculate the chunks concurrently on separate connections, so the latency is
+    # that of the slowest chunk rather than the sum of all of them
+    chunks = calculation_service.chunk_versions(pending_versions, engine.dialect.name)
+    await asyncio.gather(*(
+        run_in_threadpool(calculation_service.calculate_chunk, payload.app_id, chunk)
+        for chunk in chunks
+    ))
 
+    pending_ids = {v.variable_id for v in pending_versions}
     return {
         "status": "success",
         "application_id": payload.app_id,
-        "calculated_variables": [v.variable_id for v in latest_versions]
+        "calculated_variables": [v.variable_id for v in latest_versions],
+        "cached_variables": [v.variable_id for v in latest_versions if v.variable_id not in pending_ids]
     }
 
@@ -1,2 +1,2 @@
 # Initialize the database package
-from .session import get_db, get_db_context
\ No newline at end of file
+from .session import SessionLocal, get_db, get_db_context, init_db, release_request_session, request_session_scope
@@ -0,0 +1,12 @@
+"""
+Create the database schema out-of-band, before the API is started.
+
+Usage (from Backend/app):
+    python -m db
+"""
+
+from db.session import init_db
+
+
+if __name__ == "__main__":
+    init_db()
@@ -1,40 +1,179 @@
 # Import SQLAlchemy components and context manager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+from anyio import CapacityLimiter, to_thread
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
 from contextlib import contextmanager
 from models.variables import Base
+from utils.env import env_flag
 
 # Database configuration
-# SQLite database URL - points to the local SQLite database file
+# Database URL - can be overridden with the DATABASE_URL environment variable
 # Note: In production, consider using a more robust database like PostgreSQL
-DATABASE_URL = "sqlite:///C:/Users/atvalabeishvili/Desktop/Projects/Qubdi-Tobias/VaraiblesTest.sqlite"
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite:///C:/Users/atvalabeishvili/Desktop/Projects/Qubdi-Tobias/VaraiblesTest.sqlite"
+)
+
+# Connection pool configuration
+# Sized for FastAPI concurrency so requests reuse pooled connections instead of
+# opening a new one (and paying the TCP/TLS/login handshake) per request
+POOL_SIZE = 20               # Connections kept open in the pool
+MAX_OVERFLOW = 40            # Extra connections allowed above POOL_SIZE under bursts
+POOL_TIMEOUT = 30            # Seconds to wait for a free connection before failing
+POOL_RECYCLE = 1800          # Recycle connections older than this (seconds), below typical server/firewall idle timeouts
+
+# Set DB_EXTERNAL_POOL=1 when connections are pooled outside the process - by a
+# PgBouncer-style pooler in front of the database, or by the ODBC driver manager,
+# which pyodbc enables by default. Each worker then holds no idle connections of
+# its own, so the total connection count no longer grows with the number of workers
+EXTERNAL_POOL = env_flag("DB_EXTERNAL_POOL")
+
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite connections are shared across the FastAPI threadpool, so the
+    # same-thread check must be disabled
+    engine_options = {"connect_args": {"check_same_thread": False}}
+    if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+        # An in-memory database only exists on a single connection
+        engine_options["poolclass"] = StaticPool
+    else:
+        engine_options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+elif EXTERNAL_POOL:
+    engine_options = {"poolclass": NullPool}
+else:
+    engine_options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+    }
+
+if DATABASE_URL.startswith("mssql+pyodbc"):
+    # Send executemany() parameter sets to SQL Server in one batch instead of
+    # one round trip per row
+    engine_options["fast_executemany"] = True
 
 # Create SQLAlchemy engine
 # This is the core interface to the database
 engine = create_engine(
     DATABASE_URL,
     echo=False,              # Set to True to log all SQL statements (useful for debugging)
-    future=True              # Use SQLAlchemy 2.x style API
+    future=True,             # Use SQLAlchemy 2.x style API
+    pool_pre_ping=True,      # Check connections on checkout so dead sockets are replaced transparently
+    **engine_options
 )
 
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Tune every new SQLite connection for a write-heavy API.
+        
+        WAL lets readers run while a writer holds the lock, synchronous=NORMAL
+        drops the fsync on every commit (safe under WAL), and the temp store,
+        memory map and page cache keep hot pages out of the filesystem.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")   # 256 MB memory map
+        cursor.execute("PRAGMA cache_size=-65536")     # 64 MB page cache
+        cursor.close()
+
+def pool_capacity() -> Optional[int]:
+    """
+    Maximum number of connections the engine's pool hands out at once.
+    
+    Returns:
+        Optional[int]: POOL_SIZE + MAX_OVERFLOW for a QueuePool, or None when the
+            engine uses a pool that does not bound connections this way
+            (StaticPool for in-memory SQLite, NullPool for external pooling)
+    """
+    if isinstance(engine.pool, QueuePool):
+        return POOL_SIZE + MAX_OVERFLOW
+    return None
+
 # Create session factory
-# This is used to create new database sessions
-SessionLocal = sessionmaker(
+# This is used to create new, independent database sessions
+SessionFactory = sessionmaker(
     bind=engine,
     autoflush=False,         # Disable auto-flush to have more control over when changes are committed
     autocommit=False,        # Disable auto-commit to use explicit transactions
+    expire_on_commit=False,  # Keep loaded attributes after commit so responses don't re-SELECT the row
     future=True             # Use SQLAlchemy 2.x style API
 )
 
-# Database initialization
-# Drop and recreate all tables - WARNING: This will delete all existing data
-# Only use this during development or when you want to reset the database
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
+# Identifies the current request; bound per request by request_session_scope()
+_session_scope: ContextVar[Optional[object]] = ContextVar("session_scope", default=None)
+
+
+def _current_scope():
+    """
+    Scope key for SessionLocal: the current request, or the current thread outside requests.
+    
+    FastAPI may run a request's dependency and handler on different threadpool threads,
+    so a thread-local scope would not map one request to one session. The request scope
+    lives in a context variable, which the threadpool copies into every worker call.
+    """
+    return _session_scope.get() or threading.get_ident()
+
+
+# Request-scoped session registry
+# Every SessionLocal() call within one request returns the same session
+SessionLocal = scoped_session(SessionFactory, scopefunc=_current_scope)
+
+
+@contextmanager
+def request_session_scope():
+    """
+    Bind a new session scope for the duration of a request.
+    
+    Usage:
+        with request_session_scope():
+            # Handle the request
+            await app(scope, receive, send)
+    """
+    token = _session_scope.set(object())
+    try:
+        yield
+    finally:
+        _session_scope.reset(token)
+
+
+async def release_request_session():
+    """
+    Close the current request's session, if it opened one, and return its connection to the pool.
+    
+    Closing may roll back the connection, which blocks, so it runs in a worker thread,
+    but with a limiter of its own rather than the shared threadpool's: the threadpool can
+    be full of handlers waiting for a connection, and a close queued behind them would
+    never return the connection they are waiting for.
+    """
+    if SessionLocal.registry.has():
+        await to_thread.run_sync(SessionLocal.remove, limiter=CapacityLimiter(1))
+
+
+def init_db():
+    """
+    Create any missing database tables.
+    
+    This is called explicitly at application startup instead of on import, so
+    importing the module never touches the schema.
+    
+    Note:
+        Setting the RESET_DB environment variable to 1/true/yes drops and recreates all tables
+        first - WARNING: This will delete all existing data.
+        Only use this during development or when you want to reset the database.
+    """
+    if env_flag("RESET_DB"):
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
 
-# Declare base for models
-# This is used as the base class for all SQLAlchemy models
-Base = declarative_base()
 
 def get_db():
     """
@@ -45,13 +184,14 @@ def get_db():
         Session: A SQLAlchemy database session
         
     Note:
-        The session is automatically closed after the request is complete.
+        The session is automatically closed and removed from the registry
+        after the request is complete.
     """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        SessionLocal.remove()
 
 @contextmanager
 def get_db_context():
@@ -70,7 +210,7 @@ def get_db_context():
     Note:
         The session is automatically closed when exiting the context.
     """
-    db = SessionLocal()
+    db = SessionFactory()
     try:
         yield db
     finally:
@@ -4,11 +4,45 @@ This file sets up the FastAPI application, configures middleware, and defines th
 """
 
 # Import required FastAPI components and other dependencies
+import os
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
+from anyio import to_thread
 from api.v1 import router as variables_router  # Import the variables router from API v1
-from db.session import engine, Base
+from db import init_db, release_request_session, request_session_scope
+from db.session import pool_capacity
+
+# Development mode auto-reloads and creates the database schema on startup
+DEVELOPMENT = os.getenv("APP_ENV", "development") == "development"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan handler that prepares the database and threadpool on startup.
+    """
+    # Create missing database tables on startup during development only
+    # In production the schema is created out-of-band with "python -m db", so
+    # worker processes never pay the table introspection cost at boot
+    if DEVELOPMENT:
+        init_db()
+
+    # Database calls block, so handlers run them in the threadpool; size it to the
+    # connection pool instead of anyio's default of 40 threads, so every connection
+    # can be in use at once. This is only safe because a threadpool thread holds at
+    # most one connection, and connections held outside the threadpool are released
+    # with their own limiter (see release_request_session), so a thread waiting for a
+    # connection never waits on a release queued behind it.
+    # Pools without a fixed capacity keep the default
+    capacity = pool_capacity()
+    if capacity:
+        to_thread.current_default_thread_limiter().total_tokens = capacity
+
+    yield
 
 # Initialize FastAPI application with comprehensive metadata
 # This configuration sets up the API documentation and versioning
@@ -18,20 +52,71 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",  # Swagger UI documentation endpoint
     redoc_url="/api/redoc",  # ReDoc documentation endpoint
-    openapi_url="/api/openapi.json"  # OpenAPI schema endpoint
+    openapi_url="/api/openapi.json",  # OpenAPI schema endpoint
+    default_response_class=ORJSONResponse,  # Serialize responses with orjson instead of the stdlib json module
+    lifespan=lifespan  # Startup and shutdown handling
 )
 
 # Configure Cross-Origin Resource Sharing (CORS)
 # This middleware allows the API to be accessed from different origins
-# Note: In production, replace "*" with specific allowed origins for security
+# Allowed origins are read from CORS_ALLOW_ORIGINS as a comma-separated list
+# When unset, no cross-origin requests are allowed
+CORS_ALLOW_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOW_ORIGINS", "").split(",") if origin.strip()]
+
+# Note: with credentials enabled, Starlette answers a "*" origin by echoing back whatever
+# Origin the browser sent, so any site could make authenticated requests; credentials are
+# therefore only allowed when every origin is listed explicitly
+CORS_ALLOW_CREDENTIALS = bool(CORS_ALLOW_ORIGINS) and "*" not in CORS_ALLOW_ORIGINS
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins (configure for production)
-    allow_credentials=True,  # Allows cookies and authentication headers
+    allow_origins=CORS_ALLOW_ORIGINS,  # Allowed origins (configure for production)
+    allow_credentials=CORS_ALLOW_CREDENTIALS,  # Allows cookies and authentication headers for explicit origins only
     allow_methods=["*"],  # Allows all HTTP methods
     allow_headers=["*"],  # Allows all headers
+    max_age=86400,  # Let browsers cache preflight responses for 24 hours
 )
 
+# Compress responses larger than 1 KB (variable lists are highly compressible JSON)
+# Added after CORS so it wraps it - Starlette runs middleware in reverse order of addition
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
+# Give every request its own database session scope
+# SessionLocal() calls made while handling the request share one session,
+# which is closed and removed from the registry once the response starts
+class DBSessionScopeMiddleware:
+    """
+    ASGI middleware that binds a request-scoped database session for each request.
+    
+    Written as plain ASGI rather than with @app.middleware("http"), which runs the
+    rest of the app in a separate task and wraps every response body in a stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_after_release(message):
+            # Endpoints build their whole response before it starts, so the session is
+            # closed and its connection returned to the pool before the body is sent
+            # Note: a streaming response that reads the database while streaming would need its own session
+            if message["type"] == "http.response.start":
+                await release_request_session()
+            await send(message)
+
+        with request_session_scope():
+            try:
+                await self.app(scope, receive, send_after_release)
+            finally:
+                # Requests that failed before their response started still hold their session
+                await release_request_session()
+
+app.add_middleware(DBSessionScopeMiddleware)
+
 # Include the variables router
 # This mounts all the variable-related endpoints under the API
 app.include_router(variables_router)
@@ -55,18 +140,33 @@ async def health_check():
         "api_docs": "/api/docs"
     }
 
+# uvloop does not support Windows, where the default asyncio loop is used instead
+EVENT_LOOP = "asyncio" if sys.platform == "win32" else "uvloop"
+
+# Production (APP_ENV=production) runs one worker process per core, since a single
+# process is bound to one core by the GIL; development runs a single auto-reloading process
+# Note: without REDIS_URL each worker has its own response cache, so a write only
+# invalidates the cache of the worker that handled it; set REDIS_URL to share one cache
+WORKERS = 1 if DEVELOPMENT else int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+
 # Application entry point
 # This block runs when the script is executed directly
 if __name__ == "__main__":
-    # Start the Uvicorn server with development settings
+    # Start the Uvicorn server
     uvicorn.run(
         "main:app",  # Module and application name
         host="0.0.0.0",  # Listen on all network interfaces
         port=8000,  # Default port
-        reload=True,  # Enable auto-reload during development
-        log_level="info"  # Set logging level
+        reload=DEVELOPMENT,  # Enable auto-reload during development only
+        workers=WORKERS,  # Number of worker processes (WEB_CONCURRENCY overrides the default)
+        loop=EVENT_LOOP,  # Select the loop explicitly so a missing uvloop fails instead of falling back silently
+        http="httptools",  # Select httptools explicitly instead of silently falling back to h11
+        log_level="warning",  # Set logging level
+        access_log=False  # Per-request access logging costs a large share of throughput
     )
 
 # To run the application:
 # python Backend/main.py
-
+# In production, create the schema first (from Backend/app):
+# python -m db
+# APP_ENV=production WEB_CONCURRENCY=<workers> python main.py
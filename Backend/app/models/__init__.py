@@ -1,3 +1,13 @@
 # Import all models to simplify access
-from .variables import Variable, VariableVersion, VariableResult, VariableExecution
+from .enums import CalculationType
 
+# The SQLAlchemy models are loaded on first access rather than with the package,
+# so importing models.enums (as the schemas do) does not load SQLAlchemy
+_MODELS = ("Variable", "VariableVersion", "VariableResult", "VariableExecution")
+
+
+def __getattr__(name):
+    if name in _MODELS:
+        from . import variables
+        return getattr(variables, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,16 @@
+from enum import Enum
+
+
+# Enum defining the possible calculation types for variables
+# Defined with the models so they do not depend on the API schemas;
+# the schemas re-export it for request and response validation
+class CalculationType(str, Enum):
+    """
+    Enumeration of possible calculation types for variables.
+    
+    This enum ensures that only valid calculation types can be used when creating or updating variables.
+    The values are used to determine how the variable's SQL script should be executed.
+    """
+    LIVE = "live"    # Real-time calculation using live database
+    DWH = "dwh"      # Data warehouse calculation using historical data
+    HYBRID = "hybrid"  # Combination of live and DWH calculations
@@ -1,17 +1,23 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy import   UniqueConstraint, Enum as SQLEnum, JSON
-from sqlalchemy.orm import relationship, declarative_base, Mapped
+from sqlalchemy import   UniqueConstraint, Index, Enum as SQLEnum, JSON
+from sqlalchemy.orm import relationship, declarative_base, deferred, Mapped
 from sqlalchemy.sql import func
 from datetime import datetime
 from typing import List, Optional
 
-from schemas.variables import CalculationType
+from models.enums import CalculationType
+from utils.env import env_flag
 
 
 # Create the declarative base class for all models
 # This is used as the base class for all SQLAlchemy models in the application
 Base = declarative_base()
 
+# Loading strategy of every relationship: lazy loads raise when DEBUG=1 is set,
+# so missed eager loads fail loudly in development and CI, and fall back to
+# ordinary lazy loading in production
+RELATIONSHIP_LAZY = "raise_on_sql" if env_flag("DEBUG") else "select"
+
 
 class Variable(Base):
     """
@@ -52,6 +58,7 @@ class Variable(Base):
     )
     
     # Soft delete flag - allows for logical deletion without removing data
+    # Listings filter on it through the ix_variable_active filtered index below
     is_active: Mapped[bool] = Column(Boolean, default=True)
     
     # Audit fields for tracking creation and updates
@@ -65,17 +72,38 @@ class Variable(Base):
 
     # Relationships with cascade delete for referential integrity
     # When a variable is deleted, all its versions and results are also deleted
+    # No endpoint reads the relationships; with DEBUG set, accidental lazy loads
+    # raise instead of silently issuing one SELECT per row (N+1), so queries that
+    # need children must load them explicitly with selectinload()
     versions: Mapped[List['VariableVersion']] = relationship(
         'VariableVersion', 
         back_populates='variable',
+        lazy=RELATIONSHIP_LAZY,
         cascade="all, delete-orphan"  # Delete versions when variable is deleted
     )
     results: Mapped[List['VariableResult']] = relationship(
         'VariableResult',
         back_populates='variable',
+        lazy=RELATIONSHIP_LAZY,
         cascade="all, delete-orphan"  # Delete results when variable is deleted
     )
 
+    # Filtered index over the ids of active variables only: listings read active
+    # variables in id order straight from it, and soft-deleted rows never enter it
+    __table_args__ = (
+        Index(
+            'ix_variable_active',
+            id,
+            sqlite_where=is_active == True,
+            postgresql_where=is_active == True,
+            mssql_where=is_active == True
+        ),
+    )
+
+    # Fetch server-generated defaults (created_at, updated_at) in the INSERT/UPDATE
+    # itself via RETURNING instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class VariableVersion(Base):
     """
@@ -88,10 +116,10 @@ class VariableVersion(Base):
         id: Unique identifier
         variable_id: ID of the parent variable
         version_number: Version number of the SQL script
-        sql_script: The SQL script for calculation
+        code: The SQL script for calculation
         change_reason: Reason for the version change
-        edited_by: User who made the change
-        edited_at: Timestamp when the change was made
+        created_by: User who made the change
+        created_at: Timestamp when the change was made
     """
     __tablename__ = 'variable_versions'
 
@@ -101,11 +129,13 @@ class VariableVersion(Base):
     # Foreign key with cascade delete - when variable is deleted, versions are deleted
     variable_id: Mapped[int] = Column(Integer, ForeignKey('variables.id', ondelete='CASCADE'), nullable=False)
     
-    # Version number for tracking changes
-    version: Mapped[str] = Column(String(50), nullable=False)
+    # Version number for tracking changes - increments by one per edit
+    version_number: Mapped[int] = Column(Integer, nullable=False)
     
     # The actual SQL script that performs the calculation
-    code: Mapped[str] = Column(Text, nullable=False)
+    # Deferred because scripts can be large - loading a version entity only fetches
+    # the script when it is accessed or the query opts in with undefer()
+    code: Mapped[str] = deferred(Column(Text, nullable=False))
     
     # Optional fields for tracking changes and auditing
     change_reason: Optional[str] = Column(Text)
@@ -116,18 +146,21 @@ class VariableVersion(Base):
 
     # Relationships
     # Back-reference to parent variable
-    variable: Mapped["Variable"] = relationship('Variable', back_populates='versions')
+    variable: Mapped["Variable"] = relationship('Variable', back_populates='versions', lazy=RELATIONSHIP_LAZY)
     
     # Relationship to executions with cascade delete
     executions: Mapped[List['VariableExecution']] = relationship(
         'VariableExecution', 
         back_populates='version',
+        lazy=RELATIONSHIP_LAZY,
         cascade="all, delete-orphan"  # Delete executions when version is deleted
     )
 
     # Ensure unique version numbers per variable
+    # The descending index turns "latest version of a variable" into a single index seek
     __table_args__ = (
-        UniqueConstraint('variable_id', 'version', name='uix_variable_version'),
+        UniqueConstraint('variable_id', 'version_number', name='uix_variable_version'),
+        Index('ix_variable_version_desc', variable_id, version_number.desc()),
     )
 
 
@@ -142,9 +175,10 @@ class VariableResult(Base):
         id: Unique identifier
         application_id: ID of the application
         variable_id: ID of the calculated variable
-        value: Calculated value
-        calculated_by: System or user who calculated the value
-        calculated_at: Timestamp when the calculation was performed
+        version_number: Version of the variable's SQL script the value was calculated with
+        result: Calculated value
+        created_by: System or user who calculated the value
+        created_at: Timestamp when the calculation was performed
     """
     __tablename__ = 'variable_results'
 
@@ -155,10 +189,17 @@ class VariableResult(Base):
     application_id: str = Column(String(50), nullable=False)
     
     # Foreign key with cascade delete - when variable is deleted, results are deleted
-    variable_id: Mapped[int] = Column(Integer, ForeignKey('variables.id', ondelete='CASCADE'), nullable=False)
+    # Indexed separately because the unique constraint below leads with application_id
+    variable_id: Mapped[int] = Column(Integer, ForeignKey('variables.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    # Script version the value was calculated with - a result is deterministic per
+    # (application, variable, version), so it is only calculated once
+    version_number: Mapped[int] = Column(Integer, nullable=False)
     
-    # The calculated value stored as JSON for flexibility
-    result: Mapped[dict] = Column(JSON, nullable=False)
+    # The calculated value - scripts return a scalar of any type, which is cast to
+    # text when stored, so it is kept as plain text rather than JSON
+    # NULL when the script returns NULL or no row, e.g. a lookup with no matching rows
+    result: Mapped[Optional[str]] = Column(Text, nullable=True)
     
     # Audit fields
     created_by: Mapped[Optional[str]] = Column(String(255), nullable=True)
@@ -167,18 +208,19 @@ class VariableResult(Base):
 
     # Relationships
     # Back-reference to parent variable
-    variable: Mapped["Variable"] = relationship('Variable', back_populates='results')
+    variable: Mapped["Variable"] = relationship('Variable', back_populates='results', lazy=RELATIONSHIP_LAZY)
     
     # Relationship to executions with cascade delete
     executions: Mapped[List['VariableExecution']] = relationship(
         'VariableExecution', 
         back_populates='result',
+        lazy=RELATIONSHIP_LAZY,
         cascade="all, delete-orphan"  # Delete executions when result is deleted
     )
 
-    # Ensure unique results per application and variable
+    # Ensure unique results per application, variable and script version
     __table_args__ = (
-        UniqueConstraint('application_id', 'variable_id', name='uix_application_variable'),
+        UniqueConstraint('application_id', 'variable_id', 'version_number', name='uix_application_variable_version'),
     )
 
 
@@ -206,17 +248,24 @@ class VariableExecution(Base):
     application_id: str = Column(String(50), nullable=False)
     
     # Optional foreign key (allows NULL for failed executions)
-    variable_id: Optional[int] = Column(Integer, ForeignKey('variables.id', ondelete='SET NULL'))
+    # Indexed so per-variable lookups and the ON DELETE SET NULL do not scan the log
+    variable_id: Optional[int] = Column(Integer, ForeignKey('variables.id', ondelete='SET NULL'), index=True)
     
     # Audit fields
     executed_by: Mapped[Optional[str]] = Column(String(255), nullable=True)
     result_id: Mapped[int] = Column(Integer, ForeignKey('variable_results.id'), nullable=False)
     executed_at: Mapped[datetime] = Column(DateTime(timezone=True), server_default=func.now())
-    status: Mapped[str] = Column(String(50), nullable=False)
+    # Indexed so failed executions can be found without scanning the whole log
+    status: Mapped[str] = Column(String(50), nullable=False, index=True)
     error_message: Mapped[Optional[str]] = Column(Text, nullable=True)
     additional_metadata: Mapped[Optional[dict]] = Column(JSON, nullable=True)
 
     # Relationships
     version_id: Mapped[int] = Column(Integer, ForeignKey('variable_versions.id'), nullable=False)
-    result: Mapped["VariableResult"] = relationship('VariableResult', back_populates='executions')
-    version: Mapped["VariableVersion"] = relationship('VariableVersion', back_populates='executions')
+    result: Mapped["VariableResult"] = relationship('VariableResult', back_populates='executions', lazy=RELATIONSHIP_LAZY)
+    version: Mapped["VariableVersion"] = relationship('VariableVersion', back_populates='executions', lazy=RELATIONSHIP_LAZY)
+
+    # Execution history is looked up per application and variable
+    __table_args__ = (
+        Index('ix_executions_app_var', 'application_id', 'variable_id'),
+    )
@@ -1,21 +1,8 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from typing import Optional, List
 from datetime import datetime
-from enum import Enum
 
-
-# Enum defining the possible calculation types for variables
-# This ensures type safety and validation of calculation types
-class CalculationType(str, Enum):
-    """
-    Enumeration of possible calculation types for variables.
-    
-    This enum ensures that only valid calculation types can be used when creating or updating variables.
-    The values are used to determine how the variable's SQL script should be executed.
-    """
-    LIVE = "live"    # Real-time calculation using live database
-    DWH = "dwh"      # Data warehouse calculation using historical data
-    HYBRID = "hybrid"  # Combination of live and DWH calculations
+from models.enums import CalculationType
 
 
 # Base schema containing common fields for all variable-related schemas
@@ -97,7 +84,7 @@ class VariableResultResponse(BaseModel):
     # Required fields for calculation result
     application_id: str = Field(..., min_length=1, max_length=50, description="ID of the application")
     variable_id: int = Field(..., description="ID of the calculated variable")
-    value: str = Field(..., description="Calculated value of the variable")
+    value: Optional[str] = Field(..., description="Calculated value of the variable, or null if the script returned none")
     calculated_by: Optional[str] = Field(None, max_length=50, description="System or user who calculated the value")
     calculated_at: datetime = Field(..., description="Timestamp when the calculation was performed")
 
@@ -116,7 +103,16 @@ class VariableCalcRequest(BaseModel):
     # Application ID must be between 1 and 50 characters
     app_id: str = Field(..., min_length=1, max_length=50, description="ID of the application to calculate variables for")
     # Must provide at least one variable ID to calculate
-    variable_ids: List[int] = Field(..., min_items=1, description="List of variable IDs to calculate")
+    variable_ids: List[int] = Field(..., min_length=1, description="List of variable IDs to calculate")
+
+    @field_validator("variable_ids")
+    @classmethod
+    def deduplicate_variable_ids(cls, variable_ids: List[int]) -> List[int]:
+        """
+        Drop repeated variable IDs, keeping the first occurrence of each, so a
+        variable is never looked up or calculated twice for one request.
+        """
+        return list(dict.fromkeys(variable_ids))
 
 
 # Schema for error responses
@@ -1,2 +1,2 @@
-
-
+# Import all services to simplify access
+from . import calculation_service
@@ -0,0 +1,313 @@
+"""
+Business logic for calculating credit scoring variables.
+This module executes the variables' SQL scripts for an application and stores the results.
+"""
+
+from functools import lru_cache
+from typing import List, Tuple
+from sqlalchemy import bindparam, text, func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.orm import Session
+from db.session import SessionFactory
+from models import Variable, VariableVersion, VariableResult
+
+
+# Name of the per-connection temporary table holding the calculated values
+# Every chunk runs on its own connection, so concurrent chunks never share a table
+# SQL Server marks temporary tables with a "#" prefix instead of a TEMPORARY keyword
+CALC_TABLE = "calc_results"
+MSSQL_CALC_TABLE = "#calc_results"
+
+# SQL type the calculated values are cast to, matching the Text result column
+# SQL Server cannot cast numbers to its deprecated TEXT type, so VARCHAR(MAX) is used there
+VALUE_TYPE = "TEXT"
+MSSQL_VALUE_TYPE = "VARCHAR(MAX)"
+
+# SQL templates for the calculation, formatted once per calculation table name.
+# {table} is the calculation table and {value_type} the type of the values; {sql} is a
+# variable's script, which is kept on its own lines so a trailing "--" comment in the
+# script cannot swallow the ")"
+_CREATE_CALC_TABLE_TMPL = """{create} {table} (
+    application_id VARCHAR(50) NOT NULL,
+    variable_id INTEGER NOT NULL,
+    version_id INTEGER NOT NULL,
+    version_number INTEGER NOT NULL,
+    value {value_type}
+)"""
+_CALC_INSERT_TMPL = """INSERT INTO {table} (application_id, variable_id, version_id, version_number, value)
+SELECT :app_id, :variable_id, :version_id, :version_number, CAST((
+{sql}
+) AS {value_type})"""
+# Results a concurrent calculation stored first are skipped rather than failing on
+# uix_application_variable_version: SQLite and PostgreSQL skip them with ON CONFLICT
+# DO NOTHING (SQLite needs the WHERE to parse ON CONFLICT after a SELECT), and SQL
+# Server holds a key-range lock from the NOT EXISTS check until the insert commits
+_STORE_RESULTS_TMPL = """INSERT INTO variable_results (application_id, variable_id, version_number, result, created_by)
+SELECT c.application_id, c.variable_id, c.version_number, c.value, 'system'
+FROM {table} c
+WHERE true
+ON CONFLICT (application_id, variable_id, version_number) DO NOTHING"""
+_MSSQL_STORE_RESULTS_TMPL = """INSERT INTO variable_results (application_id, variable_id, version_number, result, created_by)
+SELECT c.application_id, c.variable_id, c.version_number, c.value, 'system'
+FROM {table} c
+WHERE NOT EXISTS (
+    SELECT 1 FROM variable_results r WITH (UPDLOCK, HOLDLOCK)
+    WHERE r.application_id = c.application_id
+        AND r.variable_id = c.variable_id
+        AND r.version_number = c.version_number
+)"""
+_LOG_EXECUTIONS_TMPL = """INSERT INTO variable_executions (application_id, variable_id, executed_by, result_id, version_id, status)
+SELECT c.application_id, c.variable_id, 'system', r.id, c.version_id, 'success'
+FROM {table} c
+JOIN variable_results r
+    ON r.application_id = c.application_id
+        AND r.variable_id = c.variable_id
+        AND r.version_number = c.version_number"""
+
+# Upper bound on the number of rendered variable statements kept in memory
+RENDER_CACHE_SIZE = 4096
+
+# Number of variables calculated per chunk; chunks run concurrently, each on its own connection
+CALC_CHUNK_SIZE = 16
+
+# Dialects whose calculations run as a single chunk. SQLite allows one writer at a
+# time: a chunk upgrading its read to a write after another chunk committed fails
+# with SQLITE_BUSY_SNAPSHOT, which the busy timeout does not retry, and an in-memory
+# database shares one connection between all sessions
+SEQUENTIAL_DIALECTS = ("sqlite",)
+
+# Sizes the variable id list is padded up to before it is sent in an IN (...) filter.
+# The SQL sent to the database still has one placeholder per id, so padding limits
+# the distinct statement shapes to one per bucket and lets the database reuse its cached plans
+ID_BUCKET_SIZES = (8, 16, 32, 64, 128, 256, 512, 1024)
+
+# Lookup statements, built once at import time. The id lists are expanding bound
+# parameters, so the statements are constructed and compiled once for any list length
+_ranked_versions = (
+    select(
+        VariableVersion.id,
+        VariableVersion.variable_id,
+        VariableVersion.version_number,
+        VariableVersion.code,
+        func.row_number().over(
+            partition_by=VariableVersion.variable_id,
+            order_by=VariableVersion.version_number.desc()
+        ).label("version_rank")
+    )
+    .join(Variable, Variable.id == VariableVersion.variable_id)
+    .where(
+        VariableVersion.variable_id.in_(bindparam("variable_ids", expanding=True)),
+        Variable.is_active == True
+    )
+    .subquery()
+)
+_LATEST_VERSIONS = (
+    select(_ranked_versions.c.id, _ranked_versions.c.variable_id, _ranked_versions.c.version_number, _ranked_versions.c.code)
+    .where(_ranked_versions.c.version_rank == 1)
+)
+_CALCULATED_VERSIONS = (
+    select(VariableResult.variable_id, VariableResult.version_number)
+    .where(
+        VariableResult.application_id == bindparam("app_id"),
+        VariableResult.variable_id.in_(bindparam("variable_ids", expanding=True))
+    )
+)
+
+
+def _pad_to_bucket(ids: List[int]) -> List[int]:
+    """
+    Pad a non-empty id list to the smallest bucket size that fits it.
+
+    The last id is repeated as padding, which does not change the result of an
+    IN (...) filter. Lists larger than the biggest bucket are returned unchanged.
+
+    Args:
+        ids (List[int]): IDs to pad
+
+    Returns:
+        List[int]: The padded list
+    """
+    for size in ID_BUCKET_SIZES:
+        if size >= len(ids):
+            return ids + [ids[-1]] * (size - len(ids))
+    return ids
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_calc_insert(variable_id: int, version_number: int, sql_code: str, calc_table: str, value_type: str) -> TextClause:
+    """
+    Render the statement that evaluates one variable version into the calculation table.
+
+    Versions are immutable (an edit always creates a new version), so the rendered
+    statement for a (variable_id, version_number) pair never changes and is cached.
+
+    Args:
+        variable_id (int): ID of the variable
+        version_number (int): Version number of the variable's script
+        sql_code (str): SQL script of the version
+        calc_table (str): Name of the calculation table
+        value_type (str): SQL type the value is cast to
+
+    Returns:
+        TextClause: INSERT ... SELECT statement taking :app_id, :variable_id, :version_id
+            and :version_number
+    """
+    return text(_CALC_INSERT_TMPL.format(table=calc_table, value_type=value_type, sql=sql_code.strip().rstrip(";")))
+
+
+@lru_cache(maxsize=None)
+def _calc_table_statements(calc_table: str, create: str, value_type: str, store_results: str) -> Tuple[TextClause, ...]:
+    """
+    Render the fixed statements that manage the calculation table.
+
+    Args:
+        calc_table (str): Name of the calculation table
+        create (str): Statement prefix that creates a temporary table on the dialect
+        value_type (str): SQL type of the calculated values
+        store_results (str): Template of the statement copying the values into variable_results
+
+    Returns:
+        Tuple[TextClause, ...]: The drop-if-exists, create, store-results,
+            log-executions and drop statements
+    """
+    return (
+        text(f"DROP TABLE IF EXISTS {calc_table}"),
+        text(_CREATE_CALC_TABLE_TMPL.format(create=create, table=calc_table, value_type=value_type)),
+        text(store_results.format(table=calc_table)),
+        text(_LOG_EXECUTIONS_TMPL.format(table=calc_table)),
+        text(f"DROP TABLE {calc_table}"),
+    )
+
+
+def get_latest_versions(db: Session, variable_ids: List[int]) -> List[Row]:
+    """
+    Get the latest version of each requested active variable.
+
+    All variables are looked up in one query, which also filters out soft-deleted
+    variables. A single ROW_NUMBER() window over (variable_id, version_number DESC)
+    picks the latest version per variable, which the ix_variable_version_desc index
+    serves as one range scan instead of a GROUP BY subquery joined back to the table.
+    Only the columns needed for the calculation are fetched.
+
+    Args:
+        db (Session): Database session
+        variable_ids (List[int]): IDs of the variables to look up
+
+    Returns:
+        List[Row]: (id, variable_id, version_number, code) of the latest version
+            of every active variable that has one
+    """
+    return db.execute(_LATEST_VERSIONS, {"variable_ids": _pad_to_bucket(list(variable_ids))}).all()
+
+
+def get_uncalculated_versions(db: Session, app_id: str, versions: List[Row]) -> List[Row]:
+    """
+    Filter out the variable versions that already have a stored result for an application.
+
+    A result is deterministic for an (application, variable, version) triple, so a
+    stored result can be reused instead of running the script again.
+
+    Args:
+        db (Session): Database session
+        app_id (str): ID of the application
+        versions (List[Row]): Variable versions, as returned by get_latest_versions
+
+    Returns:
+        List[Row]: The versions without a stored result
+    """
+    calculated = set(
+        db.execute(
+            _CALCULATED_VERSIONS,
+            {"app_id": app_id, "variable_ids": _pad_to_bucket([v.variable_id for v in versions])}
+        ).all()
+    )
+    return [v for v in versions if (v.variable_id, v.version_number) not in calculated]
+
+
+def store_results(db: Session, app_id: str, versions: List[Row]) -> None:
+    """
+    Calculate the given variable versions for an application and store the results.
+
+    Each variable's SQL script is evaluated exactly once into a temporary table.
+    The results and the execution log are then both copied from that table, so no
+    script is re-evaluated per reference the way a multiply-referenced CTE can be.
+
+    Args:
+        db (Session): Database session
+        app_id (str): ID of the application to calculate variables for
+        versions (List[Row]): Variable versions to calculate, as returned by get_latest_versions
+
+    Note:
+        The caller is responsible for committing the transaction.
+    """
+    if db.get_bind().dialect.name == "mssql":
+        calc_table, create, value_type, store_tmpl = MSSQL_CALC_TABLE, "CREATE TABLE", MSSQL_VALUE_TYPE, _MSSQL_STORE_RESULTS_TMPL
+    else:
+        calc_table, create, value_type, store_tmpl = CALC_TABLE, "CREATE TEMPORARY TABLE", VALUE_TYPE, _STORE_RESULTS_TMPL
+    drop_if_exists, create_table, store, log_executions, drop = _calc_table_statements(
+        calc_table, create, value_type, store_tmpl
+    )
+
+    # Group the parameter sets by statement so variables sharing a script run as one
+    # executemany call; the ids are bound, so each statement's text only depends
+    # on its script and stays stable across requests for the statement cache
+    batches = {}
+    for version in versions:
+        stmt = _render_calc_insert(version.variable_id, version.version_number, version.code, calc_table, value_type)
+        batches.setdefault(stmt.text, (stmt, []))[1].append({
+            "app_id": app_id,
+            "variable_id": version.variable_id,
+            "version_id": version.id,
+            "version_number": version.version_number,
+        })
+
+    # Pooled connections are reused, so clear out any table left by an earlier failure
+    db.execute(drop_if_exists)
+    db.execute(create_table)
+
+    # Evaluate every script once
+    for stmt, params in batches.values():
+        db.execute(stmt, params)
+
+    # Store the results, skipping any a concurrent request stored in the meantime
+    db.execute(store)
+
+    # Log one execution per calculated result
+    db.execute(log_executions)
+
+    db.execute(drop)
+
+def chunk_versions(versions: List[Row], dialect_name: str, size: int = CALC_CHUNK_SIZE) -> List[List[Row]]:
+    """
+    Split variable versions into chunks that can be calculated independently.
+
+    On dialects in SEQUENTIAL_DIALECTS all versions form a single chunk.
+
+    Args:
+        versions (List[Row]): Variable versions to calculate
+        dialect_name (str): Name of the database dialect the chunks run on
+        size (int): Maximum number of versions per chunk
+
+    Returns:
+        List[List[Row]]: The chunks
+    """
+    if dialect_name in SEQUENTIAL_DIALECTS:
+        return [versions] if versions else []
+    return [versions[i:i + size] for i in range(0, len(versions), size)]
+
+
+def calculate_chunk(app_id: str, versions: List[Row]) -> None:
+    """
+    Calculate and store one chunk of variable versions in its own session and transaction.
+
+    This is blocking and meant to run in the threadpool, so several chunks can be
+    evaluated concurrently on separate pooled connections.
+
+    Args:
+        app_id (str): ID of the application to calculate variables for
+        versions (List[Row]): Variable versions to calculate
+    """
+    with SessionFactory() as db:
+        store_results(db, app_id, versions)
+        db.commit()
@@ -0,0 +1,20 @@
+"""
+Shared test setup: makes the application importable and points it at a throwaway database.
+
+Run from Backend/app:
+    pip install -r ../requirements-test.txt
+    python -m pytest test
+"""
+
+import os
+import sys
+import tempfile
+
+# The application imports its packages top-level (from db import ...), as when run from Backend/app
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Set before any application module is imported, since the engine and the
+# response cache read their configuration at import time
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.sqlite')}"
+os.environ.pop("REDIS_URL", None)
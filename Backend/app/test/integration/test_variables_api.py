@@ -0,0 +1,244 @@
+"""
+Integration tests for the variables API, run through the full application
+against a temporary SQLite database file.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from anyio import to_thread
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+
+from api.v1.variables import variables_cache
+from db import SessionLocal
+from db.session import SessionFactory, engine
+from main import app
+from models.variables import Base, VariableResult
+from services import calculation_service
+from services.calculation_service import CALC_CHUNK_SIZE
+
+
+@pytest.fixture
+def client():
+    """
+    Client for the application, on empty tables and an empty response cache.
+    """
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    variables_cache.invalidate()
+    with TestClient(app) as client:
+        yield client
+
+
+def variable_payload(name, sql_script="SELECT 1", **fields):
+    return {"name": name, "calculation_type": "live", "sql_script": sql_script, "created_by": "tester", **fields}
+
+
+def test_create_variable(client):
+    response = client.post("/api/variables/", json=variable_payload("income", description="Monthly income"))
+    assert response.status_code == 201
+    variable = response.json()
+    assert variable["name"] == "income"
+    assert variable["description"] == "Monthly income"
+    assert variable["is_active"] is True
+
+    response = client.get(f"/api/variables/{variable['id']}")
+    assert response.status_code == 200
+    assert response.json() == variable
+
+
+def test_create_variable_with_duplicate_name(client):
+    assert client.post("/api/variables/", json=variable_payload("income")).status_code == 201
+    assert client.post("/api/variables/", json=variable_payload("income")).status_code == 400
+
+
+def test_get_missing_variable(client):
+    assert client.get("/api/variables/999").status_code == 404
+
+
+def stored_results(app_id):
+    """
+    Stored results of an application, as {variable_id: (version_number, result)}.
+    """
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(VariableResult.variable_id, VariableResult.version_number, VariableResult.result)
+            .where(VariableResult.application_id == app_id)
+        ).all()
+    SessionLocal.remove()
+    return {row.variable_id: (row.version_number, row.result) for row in rows}
+
+
+def test_concurrent_reads_with_few_threads_and_connections(client):
+    count = 12
+    ids = [
+        variable["id"]
+        for variable in client.post("/api/variables/bulk", json=[variable_payload(f"v{i}") for i in range(count)]).json()
+    ]
+
+    async def get_variables():
+        # Fewer threads and connections than concurrent requests: closing a finished
+        # request's session must not wait for a thread held by a request waiting for its connection
+        to_thread.current_default_thread_limiter().total_tokens = 2
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.get(f"/api/variables/{variable_id}") for variable_id in ids))
+
+    small_engine = create_engine(engine.url, pool_size=2, max_overflow=0, pool_timeout=5)
+    SessionFactory.configure(bind=small_engine)
+    try:
+        responses = asyncio.run(get_variables())
+    finally:
+        SessionFactory.configure(bind=engine)
+        small_engine.dispose()
+    assert [response.json()["id"] for response in responses] == ids
+
+
+def test_update_variable_creates_new_version(client):
+    variable_id = client.post("/api/variables/", json=variable_payload("score", "SELECT 1")).json()["id"]
+
+    response = client.put(
+        f"/api/variables/{variable_id}",
+        json={"sql_script": "SELECT 2", "change_reason": "New rule", "edited_by": "editor"}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == variable_id
+
+    # Calculations use the latest version
+    client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": [variable_id]})
+    assert stored_results("app") == {variable_id: (2, "2")}
+
+
+def test_update_missing_variable(client):
+    response = client.put(
+        "/api/variables/999",
+        json={"sql_script": "SELECT 2", "change_reason": "New rule", "edited_by": "editor"}
+    )
+    assert response.status_code == 404
+
+
+def test_list_variables_pages(client):
+    client.post("/api/variables/bulk", json=[variable_payload(f"v{i}") for i in range(5)])
+    response = client.get("/api/variables/", params={"limit": 2, "offset": 1})
+    assert [variable["name"] for variable in response.json()] == ["v1", "v2"]
+
+
+def test_list_variables_sees_writes(client):
+    client.post("/api/variables/bulk", json=[variable_payload(f"v{i}") for i in range(5)])
+
+    # A write invalidates the cached first page
+    assert len(client.get("/api/variables/").json()) == 5
+    client.post("/api/variables/", json=variable_payload("v5"))
+    assert len(client.get("/api/variables/").json()) == 6
+
+
+def test_calculate_variables(client):
+    variables = client.post(
+        "/api/variables/bulk",
+        json=[variable_payload("number", "SELECT 40 + 2"), variable_payload("text", "SELECT 'abc'")]
+    ).json()
+    ids = [variable["id"] for variable in variables]
+
+    response = client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": ids})
+    assert response.status_code == 200
+    assert response.json()["calculated_variables"] == ids
+    assert response.json()["cached_variables"] == []
+    assert stored_results("app") == {ids[0]: (1, "42"), ids[1]: (1, "abc")}
+
+    # Stored results are reused instead of recalculated
+    response = client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": ids})
+    assert response.status_code == 200
+    assert response.json()["cached_variables"] == ids
+
+
+def test_calculate_skips_results_stored_concurrently(client):
+    variable_id = client.post("/api/variables/", json=variable_payload("score", "SELECT 1")).json()["id"]
+    with SessionLocal() as db:
+        versions = calculation_service.get_latest_versions(db, [variable_id])
+    SessionLocal.remove()
+
+    # SQLite runs one writer at a time, so two requests storing the same result are
+    # stood in for by one chunk holding the version twice: both of its rows find the
+    # result missing before either is stored, like two concurrent transactions would
+    calculation_service.calculate_chunk("app", versions * 2)
+    assert stored_results("app") == {variable_id: (1, "1")}
+
+
+def test_calculate_variables_without_value(client):
+    variables = client.post(
+        "/api/variables/bulk",
+        json=[
+            variable_payload("null", "SELECT NULL"),
+            variable_payload("no_rows", "SELECT 1 WHERE 1 = 0"),
+            variable_payload("number", "SELECT 1"),
+        ]
+    ).json()
+    ids = [variable["id"] for variable in variables]
+
+    response = client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": ids})
+    assert response.status_code == 200
+    assert stored_results("app") == {ids[0]: (1, None), ids[1]: (1, None), ids[2]: (1, "1")}
+
+    # A missing value is a stored result too, so it is not recalculated
+    response = client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": ids})
+    assert response.json()["cached_variables"] == ids
+
+
+def test_calculate_more_variables_than_one_chunk(client):
+    count = CALC_CHUNK_SIZE * 4
+    # Scripts read tables, like real ones, so chunks contend for the database
+    variables = client.post(
+        "/api/variables/bulk",
+        json=[variable_payload(f"v{i}", f"SELECT COUNT(*) + {i} FROM variables") for i in range(count)]
+    ).json()
+    ids = [variable["id"] for variable in variables]
+
+    for app_id in ("first", "second", "third"):
+        response = client.post("/api/variables/calculate", json={"app_id": app_id, "variable_ids": ids})
+        assert response.status_code == 200
+        assert response.json()["calculated_variables"] == ids
+        assert stored_results(app_id) == {variable_id: (1, str(count + i)) for i, variable_id in enumerate(ids)}
+
+
+def test_calculate_validates_request(client):
+    assert client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": []}).status_code == 422
+    assert client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": [999]}).status_code == 404
+
+
+def test_create_variables_bulk(client):
+    names = ["a", "b", "c"]
+    response = client.post("/api/variables/bulk", json=[variable_payload(name) for name in names])
+    assert response.status_code == 201
+    assert [variable["name"] for variable in response.json()] == names
+
+    response = client.get("/api/variables/")
+    assert [variable["name"] for variable in response.json()] == names
+
+
+def test_create_variables_bulk_rejects_empty_and_duplicate_payloads(client):
+    assert client.post("/api/variables/bulk", json=[]).status_code == 400
+    assert client.post("/api/variables/", json=variable_payload("a")).status_code == 201
+    response = client.post("/api/variables/bulk", json=[variable_payload("b"), variable_payload("a")])
+    assert response.status_code == 400
+    assert [variable["name"] for variable in client.get("/api/variables/").json()] == ["a"]
+
+
+def test_delete_variable(client):
+    variable_id = client.post("/api/variables/", json=variable_payload("score")).json()["id"]
+    client.get("/api/variables/")
+
+    response = client.delete(f"/api/variables/{variable_id}")
+    assert response.status_code == 200
+    assert response.json()["variable_id"] == variable_id
+
+    # Soft deleted: hidden from listings and calculations, but kept for audit
+    assert client.get("/api/variables/").json() == []
+    assert client.get(f"/api/variables/{variable_id}").json()["is_active"] is False
+    response = client.post("/api/variables/calculate", json={"app_id": "app", "variable_ids": [variable_id]})
+    assert response.status_code == 404
+
+
+def test_delete_missing_variable(client):
+    assert client.delete("/api/variables/999").status_code == 404
@@ -0,0 +1,110 @@
+"""
+Unit tests for the in-process and Redis response caches.
+"""
+
+import logging
+
+import fakeredis
+import pytest
+
+from utils import cache
+from utils.cache import RedisResponseCache, ResponseCache
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """
+    Fake Redis server that every RedisResponseCache created in the test connects to.
+    """
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache.redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return server
+
+
+def test_response_cache_returns_stored_value():
+    responses = ResponseCache()
+    responses.set("key", b"value", responses.generation)
+    assert responses.get("key") == b"value"
+    assert responses.get("other") is None
+
+
+def test_response_cache_invalidate_drops_entries():
+    responses = ResponseCache()
+    responses.set("key", b"value", responses.generation)
+    responses.invalidate()
+    assert responses.get("key") is None
+
+
+def test_response_cache_drops_value_from_stale_generation():
+    responses = ResponseCache()
+    generation = responses.generation
+    responses.invalidate()
+    responses.set("key", b"value", generation)
+    assert responses.get("key") is None
+
+
+def test_response_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    responses = ResponseCache(ttl=60)
+    responses.set("key", b"value", responses.generation)
+    now[0] += 61
+    assert responses.get("key") is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    responses = ResponseCache(maxsize=2)
+    for key in ("a", "b"):
+        responses.set(key, key.encode(), responses.generation)
+    responses.get("a")
+    responses.set("c", b"c", responses.generation)
+    assert responses.get("b") is None
+    assert responses.get("a") == b"a"
+    assert responses.get("c") == b"c"
+
+
+def test_redis_cache_returns_stored_value(redis_server):
+    responses = RedisResponseCache("redis://test", "variables")
+    responses.set(("variable", 1), b'{"id":1}', responses.generation)
+    assert responses.get(("variable", 1)) == b'{"id":1}'
+    assert responses.get(("variable", 2)) is None
+
+
+def test_redis_cache_keeps_colons_in_values(redis_server):
+    responses = RedisResponseCache("redis://test", "variables")
+    responses.set("key", b'{"a":"b:c"}', responses.generation)
+    assert responses.get("key") == b'{"a":"b:c"}'
+
+
+def test_redis_cache_drops_value_from_stale_generation(redis_server):
+    responses = RedisResponseCache("redis://test", "variables")
+    generation = responses.generation
+    responses.invalidate()
+    responses.set("key", b"value", generation)
+    assert responses.get("key") is None
+
+
+def test_redis_cache_invalidation_is_shared_between_processes(redis_server):
+    writer = RedisResponseCache("redis://test", "variables")
+    reader = RedisResponseCache("redis://test", "variables")
+    reader.set("key", b"value", reader.generation)
+    assert writer.get("key") == b"value"
+    writer.invalidate()
+    assert reader.get("key") is None
+
+
+def test_redis_cache_treats_errors_as_misses(redis_server, caplog):
+    responses = RedisResponseCache("redis://test", "variables")
+    responses.set("key", b"value", responses.generation)
+    redis_server.connected = False
+
+    assert responses.generation is None
+    assert responses.get("key") is None
+    responses.set("key", b"other", None)
+    responses.set("key", b"other", 0)
+    with caplog.at_level(logging.ERROR, logger=cache.__name__):
+        responses.invalidate()
+    assert "Failed to invalidate" in caplog.text
+
+    redis_server.connected = True
+    assert responses.get("key") == b"value"
@@ -0,0 +1,36 @@
+"""
+Unit tests for the calculation service helpers that do not touch the database.
+"""
+
+from services.calculation_service import CALC_CHUNK_SIZE, ID_BUCKET_SIZES, _pad_to_bucket, chunk_versions
+
+
+def test_pad_to_bucket_repeats_last_id():
+    assert _pad_to_bucket([1, 2, 3]) == [1, 2, 3] + [3] * 5
+
+
+def test_pad_to_bucket_keeps_exact_bucket_size():
+    ids = list(range(16))
+    assert _pad_to_bucket(ids) == ids
+
+
+def test_pad_to_bucket_keeps_lists_above_largest_bucket():
+    ids = list(range(ID_BUCKET_SIZES[-1] + 1))
+    assert _pad_to_bucket(ids) == ids
+
+
+def test_chunk_versions_splits_by_size():
+    versions = list(range(CALC_CHUNK_SIZE * 2 + 1))
+    chunks = chunk_versions(versions, "postgresql")
+    assert [len(chunk) for chunk in chunks] == [CALC_CHUNK_SIZE, CALC_CHUNK_SIZE, 1]
+    assert [v for chunk in chunks for v in chunk] == versions
+
+
+def test_chunk_versions_uses_single_chunk_on_sqlite():
+    versions = list(range(CALC_CHUNK_SIZE * 2 + 1))
+    assert chunk_versions(versions, "sqlite") == [versions]
+
+
+def test_chunk_versions_without_versions():
+    assert chunk_versions([], "postgresql") == []
+    assert chunk_versions([], "sqlite") == []
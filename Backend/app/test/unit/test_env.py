@@ -0,0 +1,24 @@
+"""
+Unit tests for reading boolean flags from the environment.
+"""
+
+import pytest
+
+from utils.env import env_flag
+
+
+@pytest.mark.parametrize("value", ["1", "true", "TRUE", "yes", "on", " 1 "])
+def test_env_flag_enabled(monkeypatch, value):
+    monkeypatch.setenv("TEST_FLAG", value)
+    assert env_flag("TEST_FLAG")
+
+
+@pytest.mark.parametrize("value", ["", "0", "false", "False", "no", "off"])
+def test_env_flag_disabled(monkeypatch, value):
+    monkeypatch.setenv("TEST_FLAG", value)
+    assert not env_flag("TEST_FLAG")
+
+
+def test_env_flag_unset(monkeypatch):
+    monkeypatch.delenv("TEST_FLAG", raising=False)
+    assert not env_flag("TEST_FLAG")
@@ -1,2 +1,4 @@
-
-
+# Import lightweight utilities to simplify access
+# The response cache is imported from utils.cache directly, so importing the
+# package (as the models do for env_flag) does not load the Redis client
+from .env import env_flag
@@ -0,0 +1,202 @@
+# Import standard library components for the in-process cache
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Redis URL for a cache shared by all worker processes - when unset, every
+# process keeps its own in-process cache
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Seconds to wait for Redis before treating a lookup as a miss, so an
+# unreachable Redis slows requests down by at most this much
+REDIS_TIMEOUT = 0.5
+
+
+class ResponseCache:
+    """
+    In-process LRU cache for API responses with generation-based invalidation.
+
+    Every write to the underlying data calls invalidate(), which bumps the cache
+    generation. Readers capture the generation before querying the database and
+    store their result under it, so a result computed before a write can never
+    be served after that write.
+
+    Attributes:
+        maxsize: Maximum number of cached entries (least recently used are evicted)
+        ttl: Number of seconds an entry stays valid
+        generation: Counter bumped on every invalidation
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Endpoints run in the threadpool, so access must be synchronized
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached value.
+
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Optional[Any]: The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generation, expires_at, value = entry
+            if generation != self.generation or expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        """
+        Store a value computed while the cache was at the given generation.
+
+        The value is discarded if the cache has been invalidated since.
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+            generation (int): Value of `generation` read before computing the value
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """
+        Invalidate every cached value.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+class RedisResponseCache:
+    """
+    Response cache shared by all worker processes through Redis.
+
+    Has the same interface and generation-based invalidation as ResponseCache,
+    but the generation lives in Redis, so a write handled by one worker
+    invalidates the cached responses of every worker. Each entry is stored as
+    the generation it was computed under, a colon and the raw response bytes,
+    so a lookup is a single MGET of the generation and the entry.
+
+    The cache is best-effort: when Redis fails, lookups are misses, stores are
+    skipped and the endpoints are served from the database.
+
+    Attributes:
+        namespace: Prefix of every Redis key used by this cache
+        ttl: Number of seconds an entry stays valid
+    """
+
+    def __init__(self, url: str, namespace: str, ttl: float = 60):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(
+            url,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT
+        )
+        self._generation_key = f"{namespace}:generation"
+
+    @property
+    def generation(self) -> Optional[int]:
+        """
+        Current cache generation, shared by all processes, or None when Redis is unavailable.
+        """
+        try:
+            return int(self._redis.get(self._generation_key) or 0)
+        except redis.RedisError:
+            return None
+
+    def _entry_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key!r}"
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """
+        Get a cached value.
+
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Optional[bytes]: The cached value, or None if missing, expired, invalidated or Redis is unavailable
+        """
+        try:
+            generation, entry = self._redis.mget(self._generation_key, self._entry_key(key))
+        except redis.RedisError:
+            return None
+        if entry is None:
+            return None
+        entry_generation, _, value = entry.partition(b":")
+        if int(entry_generation) != int(generation or 0):
+            return None
+        return value
+
+    def set(self, key: Hashable, value: bytes, generation: Optional[int]) -> None:
+        """
+        Store a value computed while the cache was at the given generation.
+
+        The value is discarded if the cache has been invalidated since.
+
+        Args:
+            key (Hashable): Cache key
+            value (bytes): Response body to cache
+            generation (Optional[int]): Value of `generation` read before computing the value
+        """
+        if generation is None or generation != self.generation:
+            return
+        try:
+            self._redis.set(self._entry_key(key), b"%d:%b" % (generation, value), ex=int(self.ttl))
+        except redis.RedisError:
+            return
+
+    def invalidate(self) -> None:
+        """
+        Invalidate every cached value, in every process.
+        """
+        try:
+            self._redis.incr(self._generation_key)
+        except redis.RedisError:
+            # Other processes keep serving their entries until they expire
+            logger.exception("Failed to invalidate the %s response cache", self.namespace)
+
+
+def create_response_cache(namespace: str, maxsize: int = 1024, ttl: float = 60):
+    """
+    Create the response cache for a group of endpoints.
+
+    Uses Redis when REDIS_URL is set, so all worker processes share one cache,
+    and an in-process cache otherwise.
+
+    Args:
+        namespace (str): Name of the cache, used as the Redis key prefix
+        maxsize (int): Maximum number of entries of the in-process cache
+        ttl (float): Number of seconds an entry stays valid
+
+    Returns:
+        ResponseCache | RedisResponseCache: The cache
+    """
+    if REDIS_URL:
+        return RedisResponseCache(REDIS_URL, namespace, ttl=ttl)
+    return ResponseCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,18 @@
+# Import standard library components for reading the environment
+import os
+
+# Values that switch a flag on; anything else, including "0" and "false", leaves it off
+TRUTHY_VALUES = ("1", "true", "yes", "on")
+
+
+def env_flag(name: str) -> bool:
+    """
+    Read a boolean flag from the environment.
+
+    Args:
+        name (str): Name of the environment variable
+
+    Returns:
+        bool: True if the variable is set to 1, true, yes or on (case-insensitive)
+    """
+    return os.getenv(name, "").strip().lower() in TRUTHY_VALUES